@@ -0,0 +1,43 @@
+import sqlite3
+from typing import Optional
+
+# Path to the SQLite database holding cached LLM responses
+CACHE_DB_PATH = "llm_cache.db"
+
+
+def _connect() -> sqlite3.Connection:
+    """
+    Open a connection to the cache database, creating the cache table if it
+    doesn't exist.
+    """
+    conn = sqlite3.connect(CACHE_DB_PATH)
+    conn.execute("CREATE TABLE IF NOT EXISTS cache(k TEXT PRIMARY KEY, v TEXT)")
+    return conn
+
+
+def get(key: str) -> Optional[str]:
+    """
+    Return the cached response for the given key, or None if the key is not
+    cached or the cache cannot be read.
+    """
+    try:
+        with _connect() as conn:
+            row = conn.execute("SELECT v FROM cache WHERE k = ?", (key,)).fetchone()
+        return row[0] if row else None
+    except sqlite3.Error as e:
+        # Treat cache errors as misses so the caller falls back to the LLM
+        print(f"Warning: could not read LLM cache: {e}")
+        return None
+
+
+def set(key: str, value: str):
+    """
+    Store a response in the cache under the given key, replacing any previous
+    entry.
+    """
+    try:
+        with _connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO cache(k, v) VALUES (?, ?)", (key, value))
+    except sqlite3.Error as e:
+        # A failed write only costs a future cache miss
+        print(f"Warning: could not write LLM cache: {e}")
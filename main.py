@@ -1,10 +1,117 @@
+import asyncio
+import hashlib
 import json
 import os
+import re
+import shutil
+import time
+import httpx
 import ollama
-import requests
-from typing import List, Optional
+from typing import List, Optional, Union
+from ijson.common import JSONError
+try:
+    # Prefer the C-accelerated yajl2 backend, roughly 5x faster than pure Python
+    import ijson.backends.yajl2_c as ijson
+except ImportError:
+    import ijson
+try:
+    # Prefer orjson for parsing and serializing SerpApi responses; fall back to stdlib json
+    import orjson
+except ImportError:
+    orjson = None
+import llm_cache
 from config import SERP_API_KEY
 
+# Matches a companies file line of the form "Company Name (URL)"
+_LINE_RE = re.compile(r'^(.*?)\s*\(([^()]+)\)\s*$')
+
+# Directory and freshness window for cached SerpApi responses
+SEARCH_CACHE_DIR = "search_cache"
+SEARCH_CACHE_TTL = 24 * 60 * 60
+
+# Number of companies to fold into a single LLM prompt
+LLM_BATCH_SIZE = 5
+
+# Static instructions, passed as the system prompt so Ollama can keep their
+# prefill KV-cached across requests instead of re-processing them every call
+FOUNDERS_SYSTEM_PROMPT = ("Write a comma-separated list of the founders of the given company. "
+                          "Only include the first and last names of the founders, with particles like 'Van' or 'De' "
+                          "but without suffixes like Ph.D. and without additional context.")
+BATCH_SYSTEM_PROMPT = ("Return a JSON object mapping each company name to the list of its founders. "
+                       "Only include the first and last names of the founders, with particles like 'Van' or 'De' "
+                       "but without suffixes like Ph.D. and without additional context. Output only JSON.")
+
+
+def _json_dumps(obj, indent: bool = False) -> bytes:
+    """
+    Serialize an object to JSON bytes with orjson when available, falling back
+    to stdlib json.
+    """
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0)
+    return json.dumps(obj, indent=2 if indent else None).encode('utf-8')
+
+# Keywords a snippet must mention to be worth sending to the LLM, and the cap
+# on how many filtered snippets go into a prompt
+SNIPPET_KEYWORDS = ('founder', 'co-founder', 'founded', 'ceo', 'cto')
+MAX_SNIPPETS = 10
+
+
+def _filter_snippets(snippets: List[str]) -> List[str]:
+    """
+    Drop duplicate and off-topic snippets, keeping at most MAX_SNIPPETS that
+    mention founder-related keywords. LLM latency is linear in prompt tokens,
+    so trimming boilerplate duplicates and unrelated results here directly
+    shortens inference.
+    """
+    seen = set()
+    filtered: List[str] = []
+    for snippet in snippets:
+        # Dedupe on a normalized prefix; near-identical boilerplate differs only in the tail
+        key = snippet.strip().lower()[:80]
+        if key in seen:
+            continue
+        seen.add(key)
+
+        # Keep only snippets that plausibly talk about the company's founders
+        if any(word in snippet.lower() for word in SNIPPET_KEYWORDS):
+            filtered.append(snippet)
+    return filtered[:MAX_SNIPPETS]
+
+
+def extract_snippets_from_obj(data: dict) -> Optional[str]:
+    """
+    Extracts the 'snippet' field from all items in the 'organic_results' list
+    of an already-parsed SerpApi response, and concatenates them with a newline
+    separator.
+
+    Args:
+        data: The parsed SerpApi response.
+
+    Returns:
+        A single string of concatenated snippets separated by newlines,
+        or None if the 'organic_results' key is missing or holds no snippets.
+    """
+    # Access the 'organic_results' list
+    organic_results: Optional[List[dict]] = data.get('organic_results')
+
+    if not organic_results:
+        print("Error: 'organic_results' key not found or is empty.")
+        return None
+
+    # Extract all 'snippet' fields
+    snippets: List[str] = []
+    for result in organic_results:
+        # Safely get the 'snippet' field
+        snippet: Optional[str] = result.get('snippet')
+        if snippet:
+            snippets.append(snippet)
+
+    # Concatenate the filtered snippets with a "\n" separator
+    snippets = _filter_snippets(snippets)
+    return "\n".join(snippets) if snippets else None
+
+
 def extract_and_concatenate_snippets(file_path: str) -> Optional[str]:
     """
     Reads a JSON file, extracts the 'snippet' field from all items 
@@ -19,33 +126,24 @@ def extract_and_concatenate_snippets(file_path: str) -> Optional[str]:
         or required keys missing).
     """
     try:
-        # Read the JSON file
-        with open(file_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        # Stream only the 'snippet' fields out of the JSON file, rather than
+        # materializing the whole response tree in memory
+        with open(file_path, 'rb') as f:
+            snippets: List[str] = [s for s in ijson.items(f, 'organic_results.item.snippet') if s]
 
-        # Access the 'organic_results' list
-        organic_results: Optional[List[dict]] = data.get('organic_results')
-        
-        if not organic_results:
+        if not snippets:
             print("Error: 'organic_results' key not found or is empty.")
             return None
 
-        # Extract all 'snippet' fields
-        snippets: List[str] = []
-        for result in organic_results:
-            # Safely get the 'snippet' field
-            snippet: Optional[str] = result.get('snippet')
-            if snippet:
-                snippets.append(snippet)
-
-        # Concatenate the extracted snippets with a "\n" separator
-        return "\n".join(snippets)
+        # Concatenate the filtered snippets with a "\n" separator
+        snippets = _filter_snippets(snippets)
+        return "\n".join(snippets) if snippets else None
 
     except FileNotFoundError:
         # File not found
         print(f"Error: The file '{file_path}' was not found.")
         return None
-    except json.JSONDecodeError:
+    except JSONError:
         # Invalid JSON
         print(f"Error: The file '{file_path}' contains invalid JSON.")
         return None
@@ -55,21 +153,87 @@ def extract_and_concatenate_snippets(file_path: str) -> Optional[str]:
         return None
 
 
-def find_founders(company: str, url: str, file_name: str) -> List[str]:
+# Shared Ollama client, reused across all generate calls
+_ollama_client = ollama.AsyncClient()
+
+
+async def find_founders(company: str, url: str, snippets_source: Union[str, dict], sem: asyncio.Semaphore) -> List[str]:
     """
-    Find the founders of a company from a given URL and text file, and return the list of founders.
+    Find the founders of a company from a given URL and a snippets source —
+    either a path to a saved SerpApi response or the parsed response itself —
+    under the concurrency semaphore, and return the list of founders.
     """
-    # Extract snippets from the text file, or return an empty list if there is an error
-    snippets = extract_and_concatenate_snippets(file_name)
+    # Extract snippets from the source, or return an empty list if there is an error
+    if isinstance(snippets_source, dict):
+        snippets = extract_snippets_from_obj(snippets_source)
+    else:
+        snippets = extract_and_concatenate_snippets(snippets_source)
     if not snippets:
         return []
-    
-    # Obtain, split, strip, and return the list of founders from Gemma3, 4B model, using the snippets from the text file
-    response = ollama.generate(model='gemma3:4b', prompt=f"Write a comma-separated list of the founders of {company} ({url}). Only include the first and last names of the founders, with particles like 'Van' or 'De' but without suffixes like Ph.D. and without additional context: {snippets}")
-    founders = [founder.strip() for founder in response['response'].split(',') if founder.strip()]
+
+    # Check the persistent cache before calling the LLM; prompts are deterministic
+    # (temperature 0 by default), so identical inputs always yield identical output
+    prompt = f"Company: {company} ({url})\nSnippets:\n{snippets}"
+    cache_key = hashlib.sha256(json.dumps({"model": "gemma3:4b", "system": FOUNDERS_SYSTEM_PROMPT, "prompt": prompt}, sort_keys=True).encode()).hexdigest()
+    founders_text = llm_cache.get(cache_key)
+
+    # On a cache miss, obtain the response from Gemma3, 4B model, and cache it
+    if founders_text is None:
+        async with sem:
+            response = await _ollama_client.generate(model='gemma3:4b', system=FOUNDERS_SYSTEM_PROMPT, prompt=prompt)
+        founders_text = response['response']
+        llm_cache.set(cache_key, founders_text)
+
+    # Split, strip, and return the list of founders
+    founders = [founder.strip() for founder in founders_text.split(',') if founder.strip()]
     return founders
 
 
+async def find_founders_batch(batch: List[tuple], sem: asyncio.Semaphore) -> Optional[dict]:
+    """
+    Find the founders of several companies with a single LLM call under the
+    concurrency semaphore. The batch holds (company, url, snippets) tuples;
+    the model is asked for a JSON object mapping each company to its founders,
+    which amortizes the static prompt prefill across the whole batch. Returns
+    the parsed mapping, or None if the model's output was not valid JSON (the
+    caller should fall back to per-company calls).
+    """
+    # Build one prompt covering every company in the batch
+    sections = [f"{i}. {company} ({url}) — snippets:\n{snippets}"
+                for i, (company, url, snippets) in enumerate(batch, start=1)]
+    prompt = "Companies:\n" + "\n".join(sections)
+
+    # Check the persistent cache before calling the LLM
+    cache_key = hashlib.sha256(json.dumps({"model": "gemma3:4b", "system": BATCH_SYSTEM_PROMPT, "prompt": prompt}, sort_keys=True).encode()).hexdigest()
+    founders_text = llm_cache.get(cache_key)
+
+    # On a cache miss, obtain the response from Gemma3, 4B model, constrained to JSON output
+    cached = founders_text is not None
+    if founders_text is None:
+        async with sem:
+            response = await _ollama_client.generate(model='gemma3:4b', system=BATCH_SYSTEM_PROMPT, prompt=prompt, format='json')
+        founders_text = response['response']
+
+    # Parse the response; refuse to cache output that isn't a valid JSON object
+    try:
+        parsed = json.loads(founders_text)
+        if not isinstance(parsed, dict):
+            raise ValueError("response is not a JSON object")
+    except ValueError as e:
+        print(f"Warning: batched LLM response was not usable ({e}); falling back to per-company calls")
+        return None
+    if not cached:
+        llm_cache.set(cache_key, founders_text)
+
+    # Normalize the founder names for every company the model answered for
+    founders_map = {}
+    for company, url, snippets in batch:
+        names = parsed.get(company)
+        if isinstance(names, list):
+            founders_map[company] = [str(name).strip() for name in names if str(name).strip()]
+    return founders_map
+
+
 def load_correct_founders(file_path: str = "correct_founders.json") -> dict:
     """
     Load the correct founders from the answer key file.
@@ -182,90 +346,177 @@ def print_accuracy_table(analysis_results: dict):
     print(f"No incorrect founders listed: {no_incorrect_count}/{total_companies} ({no_incorrect_count/total_companies*100:.1f}%)")
 
 
-def search_companies(file_name: str):
+async def fetch_search_results(client: httpx.AsyncClient, sem: asyncio.Semaphore, company: str, url: str) -> tuple:
+    """
+    Perform a single SerpApi search for a company under the concurrency semaphore,
+    streaming the response body straight to the search cache, and return a
+    (company, url, cache_path) tuple. The full response is never parsed here;
+    downstream consumers stream only the fields they need out of the cached file.
+    """
+    # Search for company founders using SerpApi
+    search_query = f"{company} ({url}) founders"
+
+    # Serve the query from the local cache if a fresh copy exists, skipping the
+    # network round-trip and the SerpApi credit
+    cache_path = os.path.join(SEARCH_CACHE_DIR, f"{hashlib.sha256(search_query.encode()).hexdigest()}.json")
+    if os.path.exists(cache_path) and time.time() - os.path.getmtime(cache_path) < SEARCH_CACHE_TTL:
+        print(f"Using cached search results for {company}")
+        return company, url, cache_path
+
+    # SerpApi request
+    params = {
+        'api_key': SERP_API_KEY,
+        'engine': 'google',
+        'q': search_query,
+        'num': 10
+    }
+
+    # Stream the response body to the cache file in chunks under the semaphore,
+    # without ever materializing the whole body in memory; the final rename is
+    # atomic so a crash can't leave a truncated entry
+    tmp_path = f"{cache_path}.tmp"
+    async with sem:
+        async with client.stream('GET', 'https://serpapi.com/search', params=params, timeout=30) as response:
+            response.raise_for_status()
+            with open(tmp_path, 'wb') as f:
+                async for chunk in response.aiter_bytes():
+                    f.write(chunk)
+    os.replace(tmp_path, cache_path)
+
+    return company, url, cache_path
+
+
+async def search_companies_async(file_name: str, save_info: bool = False):
     """
     Search for the founders of the companies in the text file.
     Opens the text file, extracts each line (company + URL), uses Google Search Engine Results API
-    to search for "{LINE} founders", saves results to info/info-[COMPANY-NAME].json, calls find_founders,
-    and assembles all results into founders.json.
+    to search for "{LINE} founders" concurrently for all companies, calls find_founders on the
+    in-memory results, and assembles all results into founders.json. When save_info is True,
+    each response is also written to info/info-[COMPANY-NAME].json as a debug artifact.
     """
     # Initialize an empty dictionary to store the results
     all_founders = {}
-    
-    # Create info directory if it doesn't exist
+
+    # Create info directory if it doesn't exist and debug artifacts are requested
     info_dir = "info"
-    if not os.path.exists(info_dir):
+    if save_info and not os.path.exists(info_dir):
         os.makedirs(info_dir)
         print(f"Created directory: {info_dir}")
-    
+
+    # Create search cache directory if it doesn't exist
+    if not os.path.exists(SEARCH_CACHE_DIR):
+        os.makedirs(SEARCH_CACHE_DIR)
+        print(f"Created directory: {SEARCH_CACHE_DIR}")
+
     try:
-        # Read the companies file
+        # Parse all lines into (company, URL) pairs before issuing any requests,
+        # iterating the companies file lazily instead of reading it whole
+        companies = []
         with open(file_name, 'r', encoding='utf-8') as f:
-            lines = f.readlines()
-        
-        # Iterate over the lines in the file
-        for line in lines:
-            # Strip whitespace and skip empty lines
-            line = line.strip()
-            if not line:
+            for raw in f:
+                # Strip whitespace and skip empty lines
+                line = raw.strip()
+                if not line:
+                    continue
+
+                # Parse company name and URL from line format: "Company Name (URL)"
+                m = _LINE_RE.match(line)
+                if m:
+                    companies.append((m.group(1).strip(), m.group(2).strip()))
+                else:
+                    print(f"Skipping malformed line: {line}")
+                    continue
+
+        # Fetch all SerpApi results concurrently, capped by a semaphore to respect rate limits.
+        # The shared client keeps pooled HTTPS connections alive across companies, avoiding a
+        # fresh TCP + TLS handshake per request, and retries transient connection failures.
+        sem = asyncio.Semaphore(8)
+        transport = httpx.AsyncHTTPTransport(
+            http2=True,
+            retries=3,
+            limits=httpx.Limits(max_connections=10, max_keepalive_connections=10)
+        )
+        async with httpx.AsyncClient(transport=transport) as client:
+            results = await asyncio.gather(
+                *[fetch_search_results(client, sem, company, url) for company, url in companies],
+                return_exceptions=True
+            )
+
+        # Collect the companies whose search succeeded, keeping the cached file paths
+        fetched = []
+        for (company_part, url_part), result in zip(companies, results):
+            print(f"Processing: {company_part}")
+
+            # Report companies whose search failed, and continue with the rest
+            if isinstance(result, Exception):
+                print(f"Error searching for {company_part}: {result}")
                 continue
-                
-            # Parse company name and URL from line format: "Company Name (URL)"
-            if '(' in line and line.endswith(')'):
-                company_part = line[:line.rfind('(')].strip()
-                url_part = line[line.rfind('(')+1:-1].strip()
+
+            cache_path = result[2]
+            fetched.append((company_part, url_part, cache_path))
+
+            # Optionally copy search results to info/info-[COMPANY-NAME].json for debugging
+            if save_info:
+                try:
+                    # Create a safe filename for the company
+                    safe_company_name = "".join(c for c in company_part if c.isalnum() or c in (' ', '-', '_')).rstrip()
+                    safe_company_name = safe_company_name.replace(' ', '-')
+                    info_file_path = os.path.join(info_dir, f"info-{safe_company_name}.json")
+
+                    shutil.copyfile(cache_path, info_file_path)
+                    print(f"Saved search results to: {info_file_path}")
+
+                except Exception as e:
+                    # Unexpected error
+                    print(f"Unexpected error saving results for {company_part}: {e}")
+
+        # Extract snippets up front so several companies can share one LLM call
+        items = []
+        for company_part, url_part, cache_path in fetched:
+            snippets = extract_and_concatenate_snippets(cache_path)
+            if snippets:
+                items.append((company_part, url_part, snippets, cache_path))
             else:
-                print(f"Skipping malformed line: {line}")
-                continue
-            
-            print(f"Processing: {company_part}")
-            
-            # Search for company founders using SerpApi
-            search_query = f"{company_part} ({url_part}) founders"
-            
-            # SerpApi request
-            params = {
-                'api_key': SERP_API_KEY,
-                'engine': 'google',
-                'q': search_query,
-                'num': 10
-            }
-            
-            try:
-                # Perform a SerpApi request, and store the response
-                response = requests.get('https://serpapi.com/search', params=params)
-                response.raise_for_status()
-                search_results = response.json()
-                
-                # Create a safe filename for the company
-                safe_company_name = "".join(c for c in company_part if c.isalnum() or c in (' ', '-', '_')).rstrip()
-                safe_company_name = safe_company_name.replace(' ', '-')
-                info_file_path = os.path.join(info_dir, f"info-{safe_company_name}.json")
-                
-                # Save search results to info/info-[COMPANY-NAME].json
-                with open(info_file_path, 'w', encoding='utf-8') as f:
-                    json.dump(search_results, f, indent=2)
-                print(f"Saved search results to: {info_file_path}")
-                
-                # Call find_founders to extract founder names
-                founders = find_founders(company_part, url_part, info_file_path)
-                
-                # Store results
+                print(f"No founders found for {company_part}")
+
+        # Ask the LLM about the companies in batches, run concurrently and capped to
+        # match the number of parallel requests Ollama can serve (OLLAMA_NUM_PARALLEL)
+        llm_sem = asyncio.Semaphore(2)
+        batches = [items[i:i + LLM_BATCH_SIZE] for i in range(0, len(items), LLM_BATCH_SIZE)]
+        batch_results = await asyncio.gather(
+            *[find_founders_batch([(c, u, s) for c, u, s, _ in batch], llm_sem) for batch in batches],
+            return_exceptions=True
+        )
+
+        # Store the batched results, collecting companies that need a per-company retry
+        leftovers = []
+        for batch, result in zip(batches, batch_results):
+            if isinstance(result, Exception):
+                print(f"Error extracting founders for batch: {result}")
+                result = None
+            for company_part, url_part, snippets, cache_path in batch:
+                founders = (result or {}).get(company_part)
                 if founders:
                     all_founders[company_part] = founders
                     print(f"Found founders for {company_part}: {founders}")
+                else:
+                    leftovers.append((company_part, url_part, cache_path))
+
+        # Fall back to single-company calls for anything the batches didn't answer
+        if leftovers:
+            founders_lists = await asyncio.gather(
+                *[find_founders(company, url, cache_path, llm_sem) for company, url, cache_path in leftovers],
+                return_exceptions=True
+            )
+            for (company_part, url_part, cache_path), founders in zip(leftovers, founders_lists):
+                if isinstance(founders, Exception):
+                    print(f"Error extracting founders for {company_part}: {founders}")
+                elif founders:
+                    all_founders[company_part] = founders
+                    print(f"Found founders for {company_part}: {founders}")
                 else:
                     print(f"No founders found for {company_part}")
-                    
-            except requests.RequestException as e:
-                # Request exception
-                print(f"Error searching for {company_part}: {e}")
-                continue
-            except Exception as e:
-                # Unexpected error
-                print(f"Unexpected error processing {company_part}: {e}")
-                continue
-    
+
     except FileNotFoundError:
         # File not found
         print(f"Error: The file '{file_name}' was not found.")
@@ -277,8 +528,8 @@ def search_companies(file_name: str):
     
     # Save all results to founders.json
     try:
-        with open('founders.json', 'w', encoding='utf-8') as f:
-            json.dump(all_founders, f, indent=2)
+        with open('founders.json', 'wb') as f:
+            f.write(_json_dumps(all_founders, indent=True))
         print(f"Successfully saved founders data for {len(all_founders)} companies to founders.json")
     except Exception as e:
         # Unexpected error
@@ -293,4 +544,4 @@ def search_companies(file_name: str):
 
 if __name__ == "__main__":
     # Search for the founders of the companies in the text file
-    search_companies("companies.txt")
+    asyncio.run(search_companies_async("companies.txt"))